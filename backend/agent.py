@@ -1,11 +1,25 @@
 import re
 import logging
+import threading
 from langchain_aws import ChatBedrock
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
-from config import get_shared_client, LLM_MODEL_ID
-from tools import get_all_tools
+from config import get_shared_client, LLM_MODEL_ID, QUICK_QUESTIONS
+from tools import get_all_tools, ToolResult, estimate_tokens
 from rag import rag
+from plan_index import plan_index
+from weather import resolve_location
+from cache import (
+    NEEDS_TOOLS,
+    answer_cache,
+    semantic_cache,
+    is_quick_question,
+    is_shareable_question,
+    is_weather_dependent,
+    normalize_question,
+    profile_class,
+    class_profile,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -17,6 +31,10 @@ class RunningAssistant:
         self.llm = None
         self.tools = None
         self.conversation_history = []
+        self._warming = set()
+        self._warming_lock = threading.Lock()
+        # Chats run in worker threads; guards reads/appends of the shared history
+        self._history_lock = threading.Lock()
         self._initialized = False
     
     def setup(self):
@@ -162,11 +180,157 @@ Example week structure:
 - Sat: Tempo run
 - Sun: Long run"""
     
-    def chat(self, message: str, user_profile: dict = None) -> dict:
-        """Process a chat message"""
+    def chat(
+        self,
+        message: str,
+        user_profile: dict = None,
+        history: list = None,
+        query_embedding: list = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        Process a chat message.
+        history defaults to the shared conversation; pass a list for an isolated one.
+        query_embedding skips the embedding call when it was computed upfront.
+        use_cache=False always runs the full pipeline (e.g. evaluation runs).
+        """
         if not self._initialized:
             self.setup()
         
+        if history is None:
+            history = self.conversation_history
+        
+        if not use_cache:
+            return self._chat(message, user_profile, history, query_embedding)
+        
+        # Quick questions are answered per profile class and served from cache
+        if is_quick_question(message) and not is_weather_dependent(message):
+            return self._chat_quick_question(message, user_profile, history, query_embedding)
+        
+        # Generic free-text questions can reuse answers to paraphrases
+        if is_shareable_question(message):
+            return self._chat_semantic(message, user_profile, history, query_embedding)
+        
+        return self._chat(message, user_profile, history, query_embedding)
+    
+    def _chat_quick_question(self, message: str, user_profile: dict, history: list, query_embedding: list = None) -> dict:
+        """Answer a quick question from the cache, generating it on a miss"""
+        key = (normalize_question(message), profile_class(user_profile))
+        cached = answer_cache.get(key, version=rag.index_version)
+        
+        # Tool results are personal or live - answer with the full profile, uncached
+        if cached is NEEDS_TOOLS:
+            logger.info(f"🔧 [Cache] Quick question needs tools: {key[0]}")
+            return self._chat(message, user_profile, history, query_embedding)
+        
+        if cached is not None:
+            logger.info(f"⚡ [Cache] Quick question hit: {key[0]}")
+            self._remember(history, message, cached)
+            return {"response": cached, "success": True}
+        
+        result = self._fill_quick_question(message, user_profile, key, query_embedding)
+        if result.get("needs_tools"):
+            return self._chat(message, user_profile, history, query_embedding, retrieval=result["retrieval"])
+        
+        if result["success"]:
+            self._remember(history, message, result["response"])
+        return result
+    
+    def _fill_quick_question(self, message: str, user_profile: dict, key: tuple, query_embedding: list = None) -> dict:
+        """Generate a shareable quick question answer and cache it (or the fact it needs tools)"""
+        version = rag.index_version
+        
+        # Generate without personal data or history so the answer can be shared
+        result = self._chat(message, class_profile(user_profile), [], query_embedding, allow_tools=False)
+        
+        if result.get("needs_tools"):
+            answer_cache.set(key, NEEDS_TOOLS, version=version)
+        elif result["success"]:
+            answer_cache.set(key, result["response"], version=version)
+        return result
+    
+    def _chat_semantic(self, message: str, user_profile: dict, history: list, query_embedding: list = None) -> dict:
+        """Answer a generic question from the semantic cache, generating it on a miss"""
+        embedding = query_embedding
+        if embedding is None:
+            try:
+                embedding = rag.embed_query(message)
+            except Exception as e:
+                logger.error(f"❌ [Cache] Embedding failed: {e}")
+                return self._chat(message, user_profile, history)
+        
+        scope = (profile_class(user_profile), rag.index_version)
+        cached = semantic_cache.get(embedding, scope)
+        
+        # Tool results are personal or live - answer with the full profile, uncached
+        if cached is NEEDS_TOOLS:
+            logger.info("🔧 [Cache] Semantic hit needs tools")
+            return self._chat(message, user_profile, history, embedding)
+        
+        if cached is not None:
+            logger.info("⚡ [Cache] Semantic hit")
+            self._remember(history, message, cached)
+            return {"response": cached, "success": True}
+        
+        # Generate without personal data or history so the answer can be shared
+        result = self._chat(message, class_profile(user_profile), [], query_embedding=embedding, allow_tools=False)
+        
+        # Remember that paraphrases need tools too, and reuse this search for the retry
+        if result.get("needs_tools"):
+            semantic_cache.set(embedding, NEEDS_TOOLS, scope)
+            return self._chat(message, user_profile, history, embedding, retrieval=result["retrieval"])
+        
+        if not result["success"]:
+            return result
+        
+        semantic_cache.set(embedding, result["response"], scope)
+        self._remember(history, message, result["response"])
+        return result
+    
+    def warm_quick_questions(self, user_profile: dict = None):
+        """Pre-generate cached quick question answers for a profile class"""
+        for question in QUICK_QUESTIONS:
+            if is_weather_dependent(question):
+                continue
+            key = (normalize_question(question), profile_class(user_profile))
+            # Already answered, or known to need tools - nothing to pre-generate
+            if answer_cache.get(key, version=rag.index_version) is None:
+                self._fill_quick_question(question, user_profile, key)
+        logger.info(f"🔥 [Cache] Quick questions warm for {profile_class(user_profile)}")
+    
+    def warm_quick_questions_async(self, user_profile: dict = None):
+        """Warm the quick question cache in a background thread (one per profile class)"""
+        key = profile_class(user_profile)
+        with self._warming_lock:
+            if key in self._warming:
+                logger.info(f"🔥 [Cache] Already warming {key}, skipping")
+                return
+            self._warming.add(key)
+        
+        def warm():
+            try:
+                self.warm_quick_questions(user_profile)
+            finally:
+                with self._warming_lock:
+                    self._warming.discard(key)
+        
+        threading.Thread(target=warm, daemon=True).start()
+    
+    def _chat(
+        self,
+        message: str,
+        user_profile: dict,
+        history: list,
+        query_embedding: list = None,
+        allow_tools: bool = True,
+        retrieval: tuple = None,
+    ) -> dict:
+        """
+        Run the full RAG + LLM pipeline for a message.
+        With allow_tools=False, stops before running tools and returns needs_tools=True
+        if the LLM asked for any, plus the retrieved (context, sources) so the caller
+        can retry with the full profile without searching again.
+        """
         logger.info(f"\n{'='*50}")
         logger.info(f"💬 [User] {message[:100]}{'...' if len(message) > 100 else ''}")
         
@@ -184,9 +348,18 @@ Example week structure:
             logger.info("👤 [Profile] No profile data")
         
         try:
-            # STEP 1: Always search knowledge base first
-            logger.info("📚 [RAG] Searching knowledge base...")
-            rag_context, sources = rag.search(message, k=4)
+            # STEP 1: Answer plan week/day lookups from the plan index, else search knowledge base
+            plan_entry = plan_index.lookup(message, user_profile) if plan_index.plans and retrieval is None else None
+            if retrieval is not None:
+                # Reuse the search from the shared-answer attempt
+                rag_context, sources = retrieval
+            elif plan_entry:
+                logger.info(f"📅 [Plans] Exact match: {plan_entry['plan']} week {plan_entry['week']}")
+                rag_context = "EXACT TRAINING PLAN ENTRY (quote it as-is):\n" + plan_index.format_entry(plan_entry)
+                sources = [plan_entry["source"]]
+            else:
+                logger.info("📚 [RAG] Searching knowledge base...")
+                rag_context, sources = rag.search(message, k=4, embedding=query_embedding)
             
             if sources:
                 logger.info(f"📖 [RAG] Found context from: {', '.join(sources)}")
@@ -197,25 +370,49 @@ Example week structure:
             system_prompt = self._get_system_prompt(user_profile, rag_context)
             
             messages = [SystemMessage(content=system_prompt)]
-            messages.extend(self.conversation_history[-10:])  # Last 10 messages
+            with self._history_lock:
+                messages.extend(history[-10:])  # Last 10 messages
             messages.append(HumanMessage(content=message))
             
             # STEP 3: Let LLM respond (may use other tools like weather, calculator)
             response = self.llm_with_tools.invoke(messages)
             
             # Check if other tools were called
+            tools_used = [tool_call["name"] for tool_call in response.tool_calls]
+            if tools_used and not allow_tools:
+                logger.info(f"🔧 [Tool] {', '.join(tools_used)} needed - answer is personal")
+                return {
+                    "response": "",
+                    "success": True,
+                    "tools_used": tools_used,
+                    "needs_tools": True,
+                    "retrieval": (rag_context, sources),
+                }
+            
             if response.tool_calls:
                 tool_results = []
                 
                 for tool_call in response.tool_calls:
                     tool_name = tool_call["name"]
                     tool_args = tool_call["args"]
+                    if tool_name == "get_weather" and user_profile:
+                        # Reuse the prefetched forecast when the LLM spells the profile city differently
+                        location = resolve_location(tool_args.get("location"), user_profile.get("location"))
+                        tool_args = {**tool_args, "location": location}
                     
                     logger.info(f"🔧 [Tool] Using: {tool_name}")
                     if tool_args:
                         logger.info(f"   [Args] {tool_args}")
                     
                     result = self._execute_tool(tool_name, tool_args)
+                    if isinstance(result, ToolResult):
+                        # Send the compact form to the LLM instead of the readable text
+                        compact = result.compact()
+                        logger.info(
+                            f"📏 [Tool] {tool_name} output: ~{estimate_tokens(str(result))} → "
+                            f"~{estimate_tokens(compact)} tokens"
+                        )
+                        result = compact
                     tool_results.append(f"[{tool_name}]:\n{result}")
                 
                 # Get final response with tool results
@@ -229,16 +426,14 @@ Example week structure:
             else:
                 response_text = response.content
             
-            # Update conversation history (store WITHOUT thinking tags)
-            clean_response = self._strip_thinking(response_text)
-            self.conversation_history.append(HumanMessage(content=message))
-            self.conversation_history.append(AIMessage(content=clean_response))
+            # Update conversation history
+            self._remember(history, message, response_text)
             
             logger.info(f"✅ [Response] Generated ({len(response_text)} chars)")
             logger.info(f"{'='*50}\n")
             
             # Return FULL response - frontend will parse and display thinking separately
-            return {"response": response_text, "success": True}
+            return {"response": response_text, "success": True, "tools_used": tools_used}
         
         except Exception as e:
             logger.error(f"❌ [Error] {e}")
@@ -249,12 +444,18 @@ Example week structure:
                 "success": False
             }
     
+    def _remember(self, history: list, message: str, response_text: str):
+        """Append a turn to history (stored WITHOUT thinking tags)"""
+        turn = [HumanMessage(content=message), AIMessage(content=self._strip_thinking(response_text))]
+        with self._history_lock:
+            history.extend(turn)
+    
     def _strip_thinking(self, text: str) -> str:
         """Strip thinking tags (used for conversation history only)"""
         cleaned = re.sub(r'<thinking>.*?</thinking>', '', text, flags=re.DOTALL)
         return cleaned.strip()
     
-    def _execute_tool(self, tool_name: str, tool_args: dict) -> str:
+    def _execute_tool(self, tool_name: str, tool_args: dict) -> ToolResult | str:
         """Execute a tool by name"""
         for tool in self.tools:
             if tool.name == tool_name:
@@ -267,7 +468,8 @@ Example week structure:
     
     def reset_memory(self):
         """Clear conversation history"""
-        self.conversation_history = []
+        with self._history_lock:
+            self.conversation_history = []
         logger.info("🔄 [Agent] Conversation history cleared")
 
 
@@ -1,11 +1,22 @@
+import json
+import asyncio
+import hashlib
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional
 
 from agent import agent
 from rag import rag
+from config import QUICK_QUESTIONS, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS
+from batch import run_batch_jsonl
+from pace import analyze_training_log
+from plan_index import plan_index
+from weather import forecast_store, weather_prefetcher
+from cache import answer_cache, semantic_cache, chat_coalescer
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -48,6 +59,25 @@ class ChatResponse(BaseModel):
     success: bool
 
 
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None
+    message: str
+    user_profile: Optional[UserProfile] = None
+
+
+class BatchChatRequest(BaseModel):
+    items: list[BatchChatItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    max_concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    use_cache: bool = False
+
+
+class PaceBatchRequest(BaseModel):
+    distances_km: list[float]
+    times_minutes: list[float]
+    dates: Optional[list[str]] = None
+    target_distances: Optional[list[float]] = None
+
+
 # --- Storage ---
 user_profiles = {}
 
@@ -58,15 +88,24 @@ user_profiles = {}
 async def startup():
     logger.info("\n🚀 Starting RunCoach AI...")
     logger.info("=" * 40)
+    app.state.weather_task = asyncio.create_task(weather_prefetcher.run())
     try:
         rag.setup()
         agent.setup()
+        agent.warm_quick_questions_async(UserProfile().model_dump())
         logger.info("=" * 40)
         logger.info("✅ Server ready!\n")
     except Exception as e:
         logger.error(f"⚠️ Startup error: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    task = getattr(app.state, "weather_task", None)
+    if task:
+        task.cancel()
+
+
 # --- Endpoints ---
 
 @app.get("/")
@@ -75,21 +114,59 @@ async def health():
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(msg: ChatMessage):
-    """Main chat endpoint"""
+async def chat(msg: ChatMessage, idempotency_key: Optional[str] = Header(None)):
+    """
+    Main chat endpoint.
+    Identical in-flight requests share one execution; with an Idempotency-Key
+    header, completed responses are also replayed for retries of that key.
+    """
     try:
         profile = msg.user_profile.model_dump() if msg.user_profile else None
-        result = agent.chat(msg.message, profile)
+        if profile:
+            weather_prefetcher.touch(profile["location"])
+        
+        fingerprint = hashlib.sha256(
+            json.dumps([msg.message, profile], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        
+        # Identical requests share one run regardless of key; the key (bound to
+        # the request body) only decides which completed results are replayed
+        result = await chat_coalescer.run(
+            fingerprint,
+            lambda: run_in_threadpool(agent.chat, msg.message, profile),
+            replay_key=(idempotency_key, fingerprint) if idempotency_key else None,
+        )
         return ChatResponse(response=result["response"], success=result["success"])
     except Exception as e:
         logger.error(f"❌ Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/chat/batch")
+async def chat_batch(batch: BatchChatRequest):
+    """Run many chat items in isolated contexts, streaming results as JSONL"""
+    items = [item.model_dump() for item in batch.items]
+    return StreamingResponse(
+        run_batch_jsonl(items, batch.max_concurrency, batch.use_cache),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/api/pace/batch")
+async def pace_batch(log: PaceBatchRequest):
+    """Analyse a whole training log: paces, race predictions, mileage, best efforts"""
+    try:
+        return analyze_training_log(log.distances_km, log.times_minutes, log.dates, log.target_distances)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/api/profile")
 async def save_profile(profile: UserProfile):
     """Save user profile"""
     user_profiles["current"] = profile.model_dump()
+    weather_prefetcher.touch(profile.location)
+    agent.warm_quick_questions_async(user_profiles["current"])
     return {"message": "Profile saved!", "profile": profile}
 
 
@@ -108,8 +185,15 @@ async def reset():
 
 @app.get("/api/search")
 async def search(query: str):
-    """Direct knowledge base search"""
+    """Direct knowledge base search (training plan week/day lookups are answered exactly)"""
     try:
+        plan_entry = plan_index.lookup(query) if plan_index.plans else None
+        if plan_entry:
+            return {
+                "results": plan_index.format_entry(plan_entry),
+                "sources": [plan_entry["source"]],
+                "plan_entry": plan_entry,
+            }
         context, sources = rag.search(query, k=3)
         return {"results": context, "sources": sources}
     except Exception as e:
@@ -119,15 +203,18 @@ async def search(query: str):
 @app.get("/api/quick-questions")
 async def quick_questions():
     """Predefined quick questions"""
+    return {"questions": QUICK_QUESTIONS}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Cache hit rates, embedding batch histograms, weather prefetch and idempotency status"""
     return {
-        "questions": [
-            "🏃 How do I start running as a beginner?",
-            "🍎 What should I eat before a run?",
-            "💪 Create a training plan for me",
-            "🤕 How can I prevent injuries?",
-            "⏱️ What's a good warm-up routine?",
-            "🎯 Help me prepare for a 5K",
-        ]
+        "quick_questions": answer_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "embeddings": rag.batcher.stats() if rag.batcher else None,
+        "weather": forecast_store.stats(),
+        "chat_idempotency": chat_coalescer.stats(),
     }
 
 
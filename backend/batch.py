@@ -0,0 +1,151 @@
+"""
+Batch chat runner for offline evaluation and bulk plan generation.
+
+Usage:
+    python batch.py items.jsonl -o results.jsonl --concurrency 8
+
+Each input line is {"message": "...", "user_profile": {...}, "id": optional}.
+Each output line is {"index": n, "id": ..., "response": "...", "success": bool}.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import BATCH_MAX_CONCURRENCY
+from agent import agent
+from rag import rag
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+# Caps items in flight across all concurrent batches (each batch also has its own limit)
+_batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENCY)
+
+
+def _run_item(index: int, item: dict, embeddings: dict, use_cache: bool, cancelled: threading.Event) -> dict:
+    """Run one item in its own conversation context"""
+    message = item["message"]
+    with _batch_slots:
+        # The batch may have been abandoned while this item waited for a slot
+        if cancelled.is_set():
+            return {"index": index, "id": item.get("id"), "response": "Cancelled", "success": False}
+        result = agent.chat(
+            message,
+            item.get("user_profile"),
+            history=[],
+            query_embedding=embeddings.get(message),
+            use_cache=use_cache,
+        )
+    return {
+        "index": index,
+        "id": item.get("id"),
+        "response": result["response"],
+        "success": result["success"],
+    }
+
+
+def run_batch(items: list[dict], max_concurrency: int = BATCH_MAX_CONCURRENCY, use_cache: bool = False):
+    """
+    Run chat items with bounded parallelism.
+    Answer caches are bypassed by default so every item exercises the pipeline.
+    Yields results as they complete (use "index" to restore input order).
+    """
+    if not items:
+        return
+
+    agent.setup()
+    started = time.perf_counter()
+    logger.info(f"📦 [Batch] Running {len(items)} items (concurrency: {max_concurrency})")
+
+    # Embed all distinct messages upfront so retrieval shares the work
+    try:
+        embeddings = rag.embed_queries([item["message"] for item in items if isinstance(item.get("message"), str)])
+    except Exception as e:
+        logger.error(f"❌ [Batch] Upfront embedding failed, embedding per item: {e}")
+        embeddings = {}
+
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, BATCH_MAX_CONCURRENCY)))
+    try:
+        futures = {
+            executor.submit(_run_item, index, item, embeddings, use_cache, cancelled): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"❌ [Batch] Item {index} failed: {e}")
+                result = {
+                    "index": index,
+                    "id": items[index].get("id"),
+                    "response": f"I encountered an error: {str(e)}. Please try again.",
+                    "success": False,
+                }
+            yield result
+    except GeneratorExit:
+        # Consumer went away (e.g. client disconnected) - drop queued items
+        logger.info("🛑 [Batch] Cancelled, dropping queued items")
+        cancelled.set()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(f"✅ [Batch] Done in {time.perf_counter() - started:.1f}s")
+
+
+def run_batch_jsonl(items: list[dict], max_concurrency: int = BATCH_MAX_CONCURRENCY, use_cache: bool = False):
+    """Run a batch and yield each result as a JSON line"""
+    results = run_batch(items, max_concurrency, use_cache)
+    try:
+        for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    finally:
+        results.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run chat messages in bulk")
+    parser.add_argument("input", help="JSONL file of {message, user_profile, id} items ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL file to write results to (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_MAX_CONCURRENCY,
+                        help=f"Parallel requests (default: {BATCH_MAX_CONCURRENCY})")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="Serve answers from the quick question / semantic caches")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            lines = f.readlines()
+    items = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            parser.error(f"line {number}: invalid JSON ({e})")
+        if not isinstance(item, dict) or not isinstance(item.get("message"), str) or not item["message"].strip():
+            parser.error(f"line {number}: expected an object with a non-empty \"message\"")
+        items.append(item)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for line in run_batch_jsonl(items, args.concurrency, args.use_cache):
+            output.write(line)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
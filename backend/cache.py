@@ -0,0 +1,299 @@
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    QUICK_QUESTIONS,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_MAX_ENTRIES,
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Questions whose answer depends on live conditions - never served from cache
+WEATHER_PATTERN = re.compile(
+    r"\b(weather|rain|raining|snow|wind|windy|hot|cold|temperature|forecast|"
+    r"today|tonight|tomorrow|wear|outside|outdoors?)\b"
+)
+
+# Questions about the user's own numbers or situation
+PERSONAL_PATTERN = re.compile(r"\b(i|my|me|mine|myself|i'm|im|i've|ive|\d+)\b")
+
+# Questions that only make sense with the previous turns
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|also|what about|how about|then|so|ok|okay)\b|"
+    r"\b(it|this|that|these|those|them|above|previous|earlier)\b"
+)
+
+# Profile fields that shape generic answers (everything else is personal)
+PROFILE_CLASS_FIELDS = {
+    "experience_level": "beginner",
+    "goal": "5K",
+    "training_days": 3,
+    "dietary_preference": "none",
+}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop emoji/punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return " ".join(text.split())
+
+
+def is_weather_dependent(text: str) -> bool:
+    """Check if a question needs live weather data"""
+    return bool(WEATHER_PATTERN.search(normalize_question(text)))
+
+
+def is_shareable_question(text: str) -> bool:
+    """Check if a free-text question has a generic answer safe to share"""
+    normalized = normalize_question(text)
+    return (
+        len(normalized.split()) >= 3
+        and not WEATHER_PATTERN.search(normalized)
+        and not PERSONAL_PATTERN.search(normalized)
+        and not FOLLOW_UP_PATTERN.search(normalized)
+    )
+
+
+def profile_class(user_profile: dict = None) -> tuple:
+    """Reduce a profile to the coarse attributes answers are shared across"""
+    if not user_profile:
+        return ("anonymous",)
+    return tuple(
+        str(user_profile.get(field) or default).lower()
+        for field, default in PROFILE_CLASS_FIELDS.items()
+    )
+
+
+def class_profile(user_profile: dict = None) -> dict:
+    """Build an anonymous profile holding only the profile class fields"""
+    if not user_profile:
+        return None
+    return {
+        field: user_profile.get(field) or default
+        for field, default in PROFILE_CLASS_FIELDS.items()
+    }
+
+
+QUICK_QUESTION_KEYS = {normalize_question(q) for q in QUICK_QUESTIONS}
+
+# Cached in place of an answer for questions that turned out to need tools
+# (personal or live data), so later requests go straight to the full pipeline
+NEEDS_TOOLS = object()
+
+
+def is_quick_question(text: str) -> bool:
+    """Check if a message is one of the predefined quick questions"""
+    return normalize_question(text) in QUICK_QUESTION_KEYS
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache for chat responses"""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        """Return a cached value, or None if missing, expired or stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, entry_version, expires_at = entry
+            if expires_at < time.monotonic() or entry_version != version:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version=None):
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return size and hit-rate counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+class SemanticCache:
+    """Thread-safe cache matching questions by embedding similarity"""
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding, scope):
+        """Return the answer of the most similar question in scope, or None"""
+        query = self._unit(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self._entries.items() if entry[3] < now]
+            for entry_id in expired:
+                del self._entries[entry_id]
+
+            candidates = [
+                (entry_id, vector, answer)
+                for entry_id, (vector, answer, entry_scope, _) in self._entries.items()
+                if entry_scope == scope
+            ]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            similarities = np.stack([vector for _, vector, _ in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id, _, answer = candidates[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return answer
+
+    def set(self, embedding, answer, scope):
+        """Store an answer (or NEEDS_TOOLS), evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[self._next_id] = (
+                self._unit(embedding),
+                answer,
+                scope,
+                time.monotonic() + self.ttl_seconds,
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return size, eviction and hit-rate counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+class RequestCoalescer:
+    """
+    Share one execution between identical in-flight requests, and replay
+    completed results for a short time (idempotent client retries).
+    """
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.completed = ResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def run(self, key, make_coroutine, replay_key=None):
+        """
+        Await the result for key, starting make_coroutine() only if nobody else has.
+        In-flight requests are shared on key alone; with a replay_key (idempotency
+        key), the completed result is also kept for retries of that key.
+        """
+        if replay_key is not None:
+            cached = self.completed.get(replay_key)
+            if cached is not None:
+                logger.info("♻️ [Idempotency] Replaying completed response")
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_coroutine())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info("🔗 [Idempotency] Joined in-flight request")
+
+        if replay_key is not None:
+            task.add_done_callback(lambda done: self._remember(replay_key, done))
+
+        # Shield so one client disconnecting doesn't cancel the shared execution
+        return await asyncio.shield(task)
+
+    def _remember(self, replay_key, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is None:
+            result = task.result()
+            if result.get("success"):
+                self.completed.set(replay_key, result)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "coalesced": self.coalesced,
+            "replays": self.completed.stats(),
+        }
+
+
+# Global instances
+answer_cache = ResponseCache()
+semantic_cache = SemanticCache()
+chat_coalescer = RequestCoalescer()
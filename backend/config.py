@@ -2,6 +2,7 @@ import os
 import logging
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 
 load_dotenv()
 
@@ -19,9 +20,19 @@ AWS_SESSION_TOKEN = os.getenv('AWS_SESSION_TOKEN')
 EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
 LLM_MODEL_ID = "amazon.nova-lite-v1:0"
 
+# Bedrock connection pool / retries (sized for batched embedding + batch chat)
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS', 32))
+
+# Query embedding micro-batching
+EMBED_BATCH_WINDOW_MS = float(os.getenv('EMBED_BATCH_WINDOW_MS', 5))
+EMBED_MAX_BATCH_SIZE = int(os.getenv('EMBED_MAX_BATCH_SIZE', 32))
+EMBED_MAX_WORKERS = int(os.getenv('EMBED_MAX_WORKERS', 16))
+EMBED_TIMEOUT_SECONDS = float(os.getenv('EMBED_TIMEOUT_SECONDS', 30))
+
 # Paths
 CHROMA_PERSIST_DIR = "knowledge_base/chroma_db"
 PDF_DIRECTORY = "knowledge_base/pdfs"
+PLAN_INDEX_PATH = "knowledge_base/plan_index.json"
 
 
 def get_bedrock_client():
@@ -29,6 +40,10 @@ def get_bedrock_client():
     client_kwargs = {
         "service_name": "bedrock-runtime",
         "region_name": AWS_REGION,
+        "config": Config(
+            max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+            retries={"mode": "adaptive", "max_attempts": 5},
+        ),
     }
     
     if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
@@ -51,3 +66,38 @@ def get_shared_client():
         _bedrock_client = get_bedrock_client()
         logger.info("✅ [Config] Bedrock client ready")
     return _bedrock_client
+
+
+# Quick questions shown in the UI (also pre-warmed in the answer cache)
+QUICK_QUESTIONS = [
+    "🏃 How do I start running as a beginner?",
+    "🍎 What should I eat before a run?",
+    "💪 Create a training plan for me",
+    "🤕 How can I prevent injuries?",
+    "⏱️ What's a good warm-up routine?",
+    "🎯 Help me prepare for a 5K",
+]
+
+# Answer cache
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 6 * 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 256))
+INDEX_VERSION_CHECK_SECONDS = int(os.getenv('INDEX_VERSION_CHECK_SECONDS', 30))
+
+# Semantic cache (paraphrased free-text questions)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 512))
+
+# Batch chat (offline evaluation / bulk plan generation)
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+
+# Weather prefetch (forecasts for recently active profile locations)
+WEATHER_REFRESH_SECONDS = int(os.getenv('WEATHER_REFRESH_SECONDS', 15 * 60))
+WEATHER_MAX_AGE_SECONDS = int(os.getenv('WEATHER_MAX_AGE_SECONDS', 30 * 60))
+WEATHER_ACTIVE_WINDOW_SECONDS = int(os.getenv('WEATHER_ACTIVE_WINDOW_SECONDS', 6 * 60 * 60))
+WEATHER_PREFETCH_CONCURRENCY = int(os.getenv('WEATHER_PREFETCH_CONCURRENCY', 4))
+WEATHER_HOURLY_BUDGET = int(os.getenv('WEATHER_HOURLY_BUDGET', 120))
+
+# /api/chat idempotency (duplicate submissions and client retries)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 10 * 60))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 1024))
@@ -0,0 +1,158 @@
+import time
+import queue
+import bisect
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+
+from config import EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH_SIZE, EMBED_MAX_WORKERS, EMBED_TIMEOUT_SECONDS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram"""
+
+    def __init__(self, bounds: list[float]):
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._total = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self._total += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+            return {
+                "count": self._count,
+                "mean": round(self._total / self._count, 3) if self._count else 0.0,
+                "buckets": dict(zip(labels, self._counts)),
+            }
+
+
+def _settle(future: Future, value=None, error: Exception = None):
+    """Resolve a future unless it was already resolved"""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+    except InvalidStateError:
+        pass
+
+
+class EmbeddingBatcher:
+    """
+    Collect concurrent query embeddings over a short window and issue them together.
+    Titan embeddings take one input per request, so a batch is deduplicated and
+    fanned out over pooled connections; waiting callers get their vector back.
+    """
+
+    def __init__(
+        self,
+        embed_fn,
+        window_ms: float = EMBED_BATCH_WINDOW_MS,
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+        max_workers: int = EMBED_MAX_WORKERS,
+        timeout_seconds: float = EMBED_TIMEOUT_SECONDS,
+    ):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_seconds
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed")
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms = Histogram([1, 2, 5, 10, 20, 50, 100])
+        self.deduplicated = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            # Restart the collector if it ever died, instead of queueing forever
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect, daemon=True, name="embed-batcher")
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding and return a future for its vector"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> list[float]:
+        """Embed one text, sharing the request window with concurrent callers"""
+        return self.submit(text).result(timeout=self.timeout)
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Embed several texts through the batcher and wait for all of them"""
+        futures = [self.submit(text) for text in texts]
+        # Each vector gets its own timeout: a long list is fine as long as it keeps progressing
+        return [future.result(timeout=self.timeout) for future in futures]
+
+    def _collect(self):
+        """Background loop: gather a window of requests, then dispatch them"""
+        while True:
+            batch = [self._queue.get()]
+            try:
+                deadline = time.perf_counter() + self.window
+
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                self._dispatch(batch)
+            except Exception as e:
+                # Fail this batch's callers rather than letting the loop die
+                logger.error(f"❌ [Embed] Batch dispatch failed: {e}")
+                for _, future, _ in batch:
+                    _settle(future, error=e)
+
+    def _dispatch(self, batch: list):
+        now = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+
+        waiting = {}
+        for text, future, queued_at in batch:
+            self.wait_ms.observe((now - queued_at) * 1000)
+            waiting.setdefault(text, []).append(future)
+
+        self.deduplicated += len(batch) - len(waiting)
+        for text, futures in waiting.items():
+            self._pool.submit(self._embed, text, futures)
+
+    def _embed(self, text: str, futures: list[Future]):
+        try:
+            vector = self.embed_fn(text)
+        except Exception as e:
+            logger.error(f"❌ [Embed] Request failed: {e}")
+            for future in futures:
+                _settle(future, error=e)
+            return
+        for future in futures:
+            _settle(future, vector)
+
+    def stats(self) -> dict:
+        """Return batch-size and queue-wait histograms"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "deduplicated": self.deduplicated,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
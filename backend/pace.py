@@ -0,0 +1,134 @@
+from typing import Optional
+import numpy as np
+
+# Race distances used for predictions and best efforts (km)
+RACE_DISTANCES = {
+    "5K": 5.0,
+    "10K": 10.0,
+    "Half Marathon": 21.1,
+    "Marathon": 42.2,
+}
+
+# Riegel fatigue exponent: T2 = T1 * (D2 / D1) ** 1.06
+RIEGEL_EXPONENT = 1.06
+
+
+def _to_list(values: np.ndarray, decimals: int) -> list:
+    """Round to a JSON-friendly list, mapping NaN/inf to None"""
+    rounded = np.round(values, decimals)
+    return [float(v) if np.isfinite(v) else None for v in rounded]
+
+
+def riegel_predict(distances_km: np.ndarray, times_minutes: np.ndarray, target_km: np.ndarray) -> np.ndarray:
+    """Predict times (minutes) for every run x target distance"""
+    ratio = target_km[np.newaxis, :] / distances_km[:, np.newaxis]
+    return times_minutes[:, np.newaxis] * ratio ** RIEGEL_EXPONENT
+
+
+def rolling_weekly_km(dates: np.ndarray, distances_km: np.ndarray) -> np.ndarray:
+    """Distance covered in the 7 days up to and including each run"""
+    order = np.argsort(dates, kind="stable")
+    sorted_dates = dates[order]
+    cumulative = np.concatenate(([0.0], np.cumsum(distances_km[order])))
+
+    # Runs on the same day all count towards that day's window
+    end = np.searchsorted(sorted_dates, sorted_dates, side="right")
+    start = np.searchsorted(sorted_dates, sorted_dates - np.timedelta64(6, "D"), side="left")
+
+    rolling = np.empty_like(distances_km)
+    rolling[order] = cumulative[end] - cumulative[start]
+    return rolling
+
+
+def weekly_totals(dates: np.ndarray, distances_km: np.ndarray) -> dict:
+    """Total distance per ISO week (weeks start on Monday)"""
+    # datetime64 weeks start on Thursday (1970-01-01), shift so they start on Monday
+    weeks = ((dates - np.datetime64("1969-12-29", "D")).astype(np.int64) // 7)
+    unique_weeks, inverse = np.unique(weeks, return_inverse=True)
+    totals = np.bincount(inverse, weights=distances_km)
+    week_starts = np.datetime64("1969-12-29", "D") + unique_weeks * 7
+    return {
+        "week_start": [str(d) for d in week_starts],
+        "distance_km": np.round(totals, 2).tolist(),
+    }
+
+
+def best_efforts(distances_km: np.ndarray, pace_min_per_km: np.ndarray, target_km: np.ndarray) -> dict:
+    """Fastest pace over each target distance, from runs at least that long"""
+    eligible = distances_km[:, np.newaxis] >= target_km[np.newaxis, :]
+    paces = np.where(eligible, pace_min_per_km[:, np.newaxis], np.inf)
+    best_index = np.argmin(paces, axis=0)
+    best_pace = paces[best_index, np.arange(len(target_km))]
+    found = np.isfinite(best_pace)
+    return {
+        "run_index": [int(i) if ok else None for i, ok in zip(best_index, found)],
+        "pace_min_per_km": _to_list(best_pace, 3),
+        "time_minutes": _to_list(best_pace * target_km, 2),
+    }
+
+
+def analyze_training_log(
+    distances_km: list[float],
+    times_minutes: list[float],
+    dates: Optional[list[str]] = None,
+    target_distances: Optional[list[float]] = None,
+) -> dict:
+    """
+    Analyse a whole training log in one pass.
+    Returns per-run paces/speeds, Riegel race predictions, best efforts and,
+    when dates (YYYY-MM-DD) are given, rolling 7-day and weekly mileage.
+    Values are numeric (minutes, km, km/h); best efforts with no long enough run are null.
+    """
+    distances = np.asarray(distances_km, dtype=np.float64)
+    times = np.asarray(times_minutes, dtype=np.float64)
+
+    if distances.ndim != 1 or distances.shape != times.shape:
+        raise ValueError("distances_km and times_minutes must be lists of the same length")
+    if distances.size == 0:
+        raise ValueError("At least one run is required")
+    # NaN/inf (e.g. JSON Infinity) would otherwise surface as non-finite results
+    valid = np.isfinite(distances) & np.isfinite(times) & (distances > 0) & (times > 0)
+    if not np.all(valid):
+        raise ValueError("Distances and times must be positive finite numbers")
+
+    labels = list(RACE_DISTANCES)
+    targets = list(RACE_DISTANCES.values())
+    for target in target_distances or []:
+        labels.append(f"{target:g}km")
+        targets.append(float(target))
+    target_km = np.asarray(targets, dtype=np.float64)
+    if not np.all(np.isfinite(target_km) & (target_km > 0)):
+        raise ValueError("Target distances must be positive finite numbers")
+
+    pace = times / distances
+    speed = distances / times * 60
+    predictions = riegel_predict(distances, times, target_km)
+
+    result = {
+        "runs": {
+            "pace_min_per_km": np.round(pace, 3).tolist(),
+            "speed_kmh": np.round(speed, 2).tolist(),
+        },
+        "targets": labels,
+        "target_km": target_km.tolist(),
+        "predictions_minutes": {
+            "best": np.round(predictions.min(axis=0), 2).tolist(),
+            "per_run": np.round(predictions, 2).tolist(),
+        },
+        "best_efforts": best_efforts(distances, pace, target_km),
+        "summary": {
+            "runs": int(distances.size),
+            "total_km": round(float(distances.sum()), 2),
+            "total_minutes": round(float(times.sum()), 2),
+            "average_pace_min_per_km": round(float(times.sum() / distances.sum()), 3),
+        },
+    }
+
+    if dates is not None:
+        if len(dates) != distances.size:
+            raise ValueError("dates must have one entry per run")
+        run_dates = np.asarray(dates, dtype="datetime64[D]")
+        result["runs"]["rolling_7d_km"] = np.round(rolling_weekly_km(run_dates, distances), 2).tolist()
+        result["weekly"] = weekly_totals(run_dates, distances)
+
+    return result
@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import glob
+import hashlib
+import logging
+from pypdf import PdfReader
+
+from config import PDF_DIRECTORY, PLAN_INDEX_PATH
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+# The plan PDFs use private-use glyphs for range dashes, "x" and the day separator
+PDF_GLYPHS = str.maketrans({"\ue088": "-", "\ue09f": "x", "\ue092": ""})
+
+TITLE_PATTERN = re.compile(r"^Training Plan:\s*(.+)$")
+WEEK_PATTERN = re.compile(r"^Week\s+(\d+)$")
+DAY_PATTERN = re.compile(r"^Day\s+(\d)\s*(.+)$")
+
+QUERY_WEEK_PATTERN = re.compile(r"\bweek\s*(\d{1,2})\b")
+QUERY_DAY_PATTERN = re.compile(r"\bday\s*(\d)\b")
+# "week 3" alone is too loose ("ran 5k last week 3 times") - the query must mention a plan
+QUERY_PLAN_PATTERN = re.compile(r"\b(plan|plans|schedule|program|programme)\b")
+# Race distances with no indexed plan; the profile goal must not stand in for them
+OTHER_DISTANCE_PATTERN = re.compile(r"\b(\d+(\.\d+)?\s*(k|km|mi|miles?)|ultra)\b")
+
+
+def plan_key(title: str) -> str:
+    """Map a plan title to a key like 'beginner-half-marathon'"""
+    title = title.lower()
+    level = "beginner" if "beginner" in title else "advanced"
+    distance = "half-marathon" if "half" in title else "marathon"
+    return f"{level}-{distance}"
+
+
+def parse_plan(text: str) -> dict:
+    """Parse extracted plan text into {week: {day: workout}}"""
+    weeks = {}
+    week = None
+
+    for line in text.translate(PDF_GLYPHS).splitlines():
+        line = " ".join(line.split())
+
+        match = WEEK_PATTERN.match(line)
+        if match:
+            week = weeks.setdefault(match.group(1), {})
+            continue
+
+        # Page footers and titles fall through without matching
+        match = DAY_PATTERN.match(line)
+        if match and week is not None:
+            week[match.group(1)] = match.group(2)
+
+    return weeks
+
+
+class PlanIndex:
+    """Week/day index over the Training_Plan_*.pdf tables"""
+
+    def __init__(self):
+        self.plans = {}
+        self._initialized = False
+
+    def setup(self):
+        """Load the saved index, rebuilding it if the plan PDFs changed"""
+        if self._initialized:
+            return
+
+        fingerprint = self._fingerprint()
+        if os.path.exists(PLAN_INDEX_PATH):
+            with open(PLAN_INDEX_PATH, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("fingerprint") == fingerprint:
+                self.plans = saved["plans"]
+
+        if not self.plans:
+            self._build(fingerprint)
+
+        self._initialized = True
+        logger.info(f"✅ [Plans] Indexed {len(self.plans)} training plans")
+
+    def _plan_files(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(PDF_DIRECTORY, "Training_Plan_*.pdf")))
+
+    def _fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        for path in self._plan_files():
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:12]
+
+    def _build(self, fingerprint: str):
+        """Extract plan tables from the PDFs and save them next to the vector store"""
+        logger.info("📅 [Plans] Building training plan index...")
+        self.plans = {}
+
+        for path in self._plan_files():
+            text = "\n".join(page.extract_text() for page in PdfReader(path).pages)
+            # The cover title wraps over two lines; the page header repeats it in full
+            titles = [" ".join(m.group(1).split()) for m in map(TITLE_PATTERN.match, text.splitlines()) if m]
+            title = max(titles, key=len) if titles else os.path.basename(path)
+            self.plans[plan_key(title)] = {
+                "title": title,
+                "source": os.path.basename(path),
+                "weeks": parse_plan(text),
+            }
+
+        os.makedirs(os.path.dirname(PLAN_INDEX_PATH), exist_ok=True)
+        with open(PLAN_INDEX_PATH, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "plans": self.plans}, f, ensure_ascii=False)
+
+    def _match_plan(self, query: str, user_profile: dict = None):
+        """Pick the plan a query refers to, falling back to the user's profile unless it names another race"""
+        profile = user_profile or {}
+        experience = (profile.get("experience_level") or "").lower()
+        goal = (profile.get("goal") or "").lower()
+
+        if "beginner" in query or "novice" in query:
+            level = "beginner"
+        elif "advanced" in query:
+            level = "advanced"
+        elif experience in ("beginner", "advanced"):
+            level = experience
+        else:
+            return None
+
+        if "half" in query:
+            distance = "half-marathon"
+        elif "marathon" in query:
+            distance = "marathon"
+        elif OTHER_DISTANCE_PATTERN.search(query):
+            return None
+        elif "marathon" in goal:
+            distance = "half-marathon" if "half" in goal else "marathon"
+        else:
+            return None
+
+        return self.plans.get(f"{level}-{distance}")
+
+    def lookup(self, query: str, user_profile: dict = None) -> dict:
+        """
+        Answer "week N (day M) of <plan>" directly from the index.
+        Returns the matching entry, or None if the query isn't a plan lookup.
+        """
+        if not self._initialized:
+            self.setup()
+
+        query = query.lower()
+        week_match = QUERY_WEEK_PATTERN.search(query)
+        if not week_match or not QUERY_PLAN_PATTERN.search(query):
+            return None
+
+        plan = self._match_plan(query, user_profile)
+        if plan is None:
+            return None
+
+        week = week_match.group(1)
+        days = plan["weeks"].get(week)
+        if days is None:
+            return None
+
+        entry = {"plan": plan["title"], "source": plan["source"], "week": int(week)}
+        day_match = QUERY_DAY_PATTERN.search(query)
+        if day_match:
+            day = day_match.group(1)
+            if day not in days:
+                return None
+            entry["day"] = int(day)
+            entry["workout"] = days[day]
+        else:
+            entry["days"] = {int(day): workout for day, workout in days.items()}
+        return entry
+
+    def format_entry(self, entry: dict) -> str:
+        """Render a lookup result as knowledge base context"""
+        header = f"[Source: {entry['source']}, Training plan table]\n{entry['plan']} - Week {entry['week']}"
+        if "workout" in entry:
+            return f"{header}, Day {entry['day']}: {entry['workout']}"
+        rows = "\n".join(f"Day {day}: {workout}" for day, workout in entry["days"].items())
+        return f"{header}\n{rows}"
+
+
+# Global instance
+plan_index = PlanIndex()
@@ -1,11 +1,15 @@
 import os
+import time
+import hashlib
 import logging
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_aws import BedrockEmbeddings
 from langchain_chroma import Chroma
 
-from config import get_shared_client, EMBEDDING_MODEL_ID, CHROMA_PERSIST_DIR, PDF_DIRECTORY
+from config import get_shared_client, EMBEDDING_MODEL_ID, CHROMA_PERSIST_DIR, PDF_DIRECTORY, INDEX_VERSION_CHECK_SECONDS
+from embedding_batcher import EmbeddingBatcher
+from plan_index import plan_index
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -16,6 +20,9 @@ class RAGPipeline:
     def __init__(self):
         self.vectorstore = None
         self.embeddings = None
+        self.batcher = None
+        self._index_version = None
+        self._index_version_checked_at = 0.0
         self._initialized = False
     
     def setup(self):
@@ -30,6 +37,7 @@ class RAGPipeline:
             client=get_shared_client(),
             model_id=EMBEDDING_MODEL_ID
         )
+        self.batcher = EmbeddingBatcher(self.embeddings.embed_query)
         
         # Load existing vectorstore or create new one
         if os.path.exists(CHROMA_PERSIST_DIR) and os.listdir(CHROMA_PERSIST_DIR):
@@ -41,6 +49,13 @@ class RAGPipeline:
         else:
             self._create_vectorstore()
         
+        # Structured week/day index over the training plan tables
+        try:
+            plan_index.setup()
+        except Exception as e:
+            logger.error(f"⚠️ [Plans] Could not build training plan index: {e}")
+        
+        self._index_version = None  # Recomputed on next access
         self._initialized = True
         logger.info("✅ [RAG] Ready!")
     
@@ -76,16 +91,66 @@ class RAGPipeline:
             persist_directory=CHROMA_PERSIST_DIR
         )
         logger.info("✅ [RAG] ChromaDB created and persisted!")
+        self._index_version = None  # Recomputed on next access
+    
+    @property
+    def index_version(self) -> str:
+        """
+        Fingerprint of the knowledge base, re-checked every few seconds so
+        caches keyed on it are invalidated when the index changes at runtime.
+        """
+        now = time.monotonic()
+        if self._index_version is None or now - self._index_version_checked_at > INDEX_VERSION_CHECK_SECONDS:
+            self._index_version = self._compute_index_version()
+            self._index_version_checked_at = now
+        return self._index_version
+    
+    def _compute_index_version(self) -> str:
+        """Fingerprint the indexed PDFs and vector store so caches can detect changes"""
+        digest = hashlib.sha1()
+        
+        # PDFs by size/mtime: an edited or replaced PDF changes the version
+        if os.path.exists(PDF_DIRECTORY):
+            for name in sorted(os.listdir(PDF_DIRECTORY)):
+                stat = os.stat(os.path.join(PDF_DIRECTORY, name))
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        
+        # Vector store by entry names only: a rebuild creates a new collection
+        # directory, while routine sqlite writes must not invalidate the caches
+        if os.path.exists(CHROMA_PERSIST_DIR):
+            for name in sorted(os.listdir(CHROMA_PERSIST_DIR)):
+                digest.update(name.encode())
+        
+        return digest.hexdigest()[:12]
+    
+    def embed_query(self, query: str) -> list[float]:
+        """Embed a query so it can be reused across cache lookup and search"""
+        if not self._initialized:
+            self.setup()
+        return self.batcher.embed(query)
+    
+    def embed_queries(self, queries: list[str]) -> dict[str, list[float]]:
+        """Embed many queries at once, embedding each distinct query only once"""
+        if not self._initialized:
+            self.setup()
+        unique = list(dict.fromkeys(queries))
+        if not unique:
+            return {}
+        return dict(zip(unique, self.batcher.embed_many(unique)))
     
-    def search(self, query: str, k: int = 4) -> tuple[str, list[str]]:
+    def search(self, query: str, k: int = 4, embedding: list[float] = None) -> tuple[str, list[str]]:
         """
         Search knowledge base and return formatted context.
+        Pass a precomputed query embedding to skip the embedding call;
+        otherwise the query is embedded through the micro-batcher.
         Returns: (context_string, list_of_sources)
         """
         if not self._initialized:
             self.setup()
         
-        docs = self.vectorstore.similarity_search(query, k=k)
+        if embedding is None:
+            embedding = self.embed_query(query)
+        docs = self.vectorstore.similarity_search_by_vector(embedding, k=k)
         
         if not docs:
             logger.info("📭 [RAG] No relevant documents found")
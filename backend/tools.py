@@ -1,7 +1,40 @@
+import re
+import json
+from dataclasses import dataclass
 from datetime import datetime
 from langchain_core.tools import tool
 from typing import Optional
-import requests
+
+from weather import forecast_store, score_slots, slots_left, rank_run_windows, best_window_per_day, midday_slot
+
+
+# Decorative symbols dropped from the LLM rendering
+EMOJI_PATTERN = re.compile(r"[\u2600-\u27bf\U0001f300-\U0001faff\ufe0f]\s*")
+
+# Column order for forecast and run-window rows in the compact weather result
+FORECAST_COLUMNS = ["date", "desc", "temp_c", "feels_c", "hum", "wind_kmh", "rain_pct", "best"]
+WINDOW_COLUMNS = ["date", "time", "score", "desc", "feels_c", "rain_pct"]
+
+
+@dataclass
+class ToolResult:
+    """
+    Structured tool output with two renderings:
+    compact() for the LLM (minified data) and str() for human-readable text.
+    """
+    data: dict
+    text: str
+
+    def compact(self) -> str:
+        return EMOJI_PATTERN.sub("", json.dumps(self.data, separators=(",", ":"), ensure_ascii=False))
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
 
 
 @tool
@@ -27,7 +60,7 @@ def search_knowledge_base(query: str) -> str:
 
 
 @tool
-def get_weather(location: str) -> str:
+def get_weather(location: str) -> ToolResult:
     """
     Get current weather and forecast for a location to help plan runs.
     Use this tool when the user asks about weather, whether they should run today,
@@ -37,24 +70,31 @@ def get_weather(location: str) -> str:
         location: City name (e.g., "London" or "Kathmandu")
     """
     try:
-        # Get detailed weather data from wttr.in
-        response = requests.get(
-            f"https://wttr.in/{location}?format=j1",
-            timeout=10
-        )
+        # Parsed forecast, prefetched in the background for active users
+        forecast = forecast_store.get_forecast(location)
         
-        if response.status_code != 200:
-            return f"Could not get weather for {location}. Check the city name."
+        if forecast is None:
+            message = f"Could not get weather for {location}. Check the city name."
+            return ToolResult(data={"loc": location, "error": message}, text=message)
         
-        data = response.json()
-        current = data["current_condition"][0]
+        current = forecast["current"]
+        temp = current["temp_c"]
+        feels_like = current["feels_c"]
+        humidity = current["hum"]
+        wind = current["wind_kmh"]
+        description = current["desc"]
         
-        # Parse current conditions
-        temp = int(current["temp_C"])
-        feels_like = int(current["FeelsLikeC"])
-        humidity = int(current["humidity"])
-        wind = int(current["windspeedKmph"])
-        description = current["weatherDesc"][0]["value"]
+        warnings, recommendations = assess_running_conditions(temp, humidity, wind, description)
+        result_data = {
+            "loc": location,
+            "now": {"desc": description, "temp_c": temp, "feels_c": feels_like, "hum": humidity, "wind_kmh": wind},
+            "warn": warnings,
+            "advice": recommendations,
+            "day_cols": FORECAST_COLUMNS,
+            "days": [],
+            "win_cols": WINDOW_COLUMNS,
+            "windows": [],
+        }
         
         # Build current weather section
         result = f"""🌤️ WEATHER FOR {location.upper()}
@@ -65,50 +105,67 @@ CURRENT CONDITIONS:
 • Humidity: {humidity}%
 • Wind: {wind} km/h
 
-{get_running_recommendation(temp, humidity, wind, description)}
+{format_running_recommendation(warnings, recommendations)}
 """
         
-        # Get 3-day forecast
-        if "weather" in data and len(data["weather"]) > 0:
+        # Get 3-day forecast (midday conditions + best scored slot per day)
+        if forecast["hours"].size:
             result += "\n📅 FORECAST FOR PLANNING:\n"
+            scores = score_slots(forecast)
+            best_windows = best_window_per_day(forecast, scores)
+            remaining = slots_left(forecast)
             
-            for i, day in enumerate(data["weather"][:3]):
-                date = day["date"]
-                
+            for day, date in enumerate(forecast["dates"]):
                 # Parse date for nice formatting
                 date_obj = datetime.strptime(date, "%Y-%m-%d")
                 day_name = date_obj.strftime("%A, %b %d")
                 
-                # Get midday conditions (index 4 = noon)
-                if len(day["hourly"]) > 4:
-                    noon = day["hourly"][4]
-                else:
-                    noon = day["hourly"][0]
-                
-                f_temp = int(noon["tempC"])
-                f_feels = int(noon["FeelsLikeC"])
-                f_humidity = int(noon["humidity"])
-                f_wind = int(noon["windspeedKmph"])
-                f_desc = noon["weatherDesc"][0]["value"]
-                f_rain = noon.get("chanceofrain", "0")
+                slot = midday_slot(forecast, day)
+                f_temp = int(forecast["temp_c"][day, slot])
+                f_feels = int(forecast["feels_c"][day, slot])
+                f_humidity = int(forecast["hum"][day, slot])
+                f_wind = int(forecast["wind_kmh"][day, slot])
+                f_desc = str(forecast["desc"][day, slot])
+                f_rain = int(forecast["rain_pct"][day, slot])
                 
-                best_time = get_best_run_time(f_temp, f_humidity)
+                best = best_windows[day]
+                if best:
+                    best_time = best["time"]
+                    best_str = f"{best['time']} ({best['desc']}, feels {best['feels_c']}°C)"
+                elif not remaining[day]:
+                    # Today is over - not a weather problem
+                    best_time = "none left"
+                    best_str = "No daylight slots left today"
+                else:
+                    best_time = None
+                    best_str = "No safe slot - consider an indoor workout"
+                result_data["days"].append([date, f_desc, f_temp, f_feels, f_humidity, f_wind, f_rain, best_time])
                 
-                rain_str = f" | Rain chance: {f_rain}%" if int(f_rain) > 20 else ""
+                rain_str = f" | Rain chance: {f_rain}%" if f_rain > 20 else ""
                 
                 result += f"\n{day_name}:\n"
                 result += f"  • {f_desc}, {f_temp}°C (feels {f_feels}°C)\n"
                 result += f"  • Humidity: {f_humidity}% | Wind: {f_wind} km/h{rain_str}\n"
-                result += f"  • Best time to run: {best_time}\n"
+                result += f"  • Best time to run: {best_str}\n"
+            
+            # Best slots across all days
+            windows = rank_run_windows(forecast, scores=scores)
+            if windows:
+                result += "\n🏅 TOP RUN WINDOWS:\n"
+                for w in windows:
+                    day_name = datetime.strptime(w["date"], "%Y-%m-%d").strftime("%a %b %d")
+                    result += f"  • {day_name} {w['time']} - score {w['score']}/100 ({w['desc']}, feels {w['feels_c']}°C, rain {w['rain_pct']}%)\n"
+                    result_data["windows"].append([w[col] for col in WINDOW_COLUMNS])
         
-        return result
+        return ToolResult(data=result_data, text=result)
     
     except Exception as e:
-        return f"Weather service error: {str(e)}"
+        message = f"Weather service error: {str(e)}"
+        return ToolResult(data={"loc": location, "error": message}, text=message)
 
 
-def get_running_recommendation(temp: float, humidity: float, wind: float, description: str) -> str:
-    """Generate running-specific recommendations based on weather"""
+def assess_running_conditions(temp: float, humidity: float, wind: float, description: str) -> tuple[list[str], list[str]]:
+    """Return (warnings, recommendations) for running in these conditions"""
     recommendations = []
     warnings = []
     
@@ -154,7 +211,11 @@ def get_running_recommendation(temp: float, humidity: float, wind: float, descri
     if "snow" in desc_lower:
         warnings.append("⚠️ Snow - watch for ice, shorten stride")
     
-    # Build output
+    return warnings, recommendations
+
+
+def format_running_recommendation(warnings: list[str], recommendations: list[str]) -> str:
+    """Format warnings and recommendations as readable text"""
     output = "🏃 RUNNING RECOMMENDATION:\n"
     
     if warnings:
@@ -166,18 +227,6 @@ def get_running_recommendation(temp: float, humidity: float, wind: float, descri
     return output
 
 
-def get_best_run_time(temp: float, humidity: float) -> str:
-    """Suggest best time to run based on conditions"""
-    if temp > 25:
-        return "Early morning (5-7 AM) or evening (after 6 PM)"
-    elif temp > 20:
-        return "Morning (6-9 AM) or evening (5-7 PM)"
-    elif temp < 5:
-        return "Midday (11 AM - 2 PM) when warmest"
-    else:
-        return "Anytime - conditions are favorable"
-
-
 @tool
 def calculate_nutrition(
     weight_kg: float,
@@ -185,7 +234,7 @@ def calculate_nutrition(
     age: int,
     gender: str = "male",
     activity_level: str = "moderate"
-) -> str:
+) -> ToolResult:
     """
     Calculate BMR, TDEE, and macro recommendations for a runner.
     
@@ -219,7 +268,16 @@ def calculate_nutrition(
     carbs_g = (tdee * 0.55) / 4  # 55% from carbs
     fat_g = (tdee * 0.25) / 9    # 25% from fat
     
-    return f"""Nutrition Calculator Results:
+    data = {
+        "bmr": round(bmr),
+        "tdee": round(tdee),
+        "protein_g": round(protein_g),
+        "carbs_g": round(carbs_g),
+        "fat_g": round(fat_g),
+        "water_ml": round(weight_kg * 35),
+    }
+    
+    text = f"""Nutrition Calculator Results:
 
 📊 Basic Stats:
 - BMR (Basal Metabolic Rate): {bmr:.0f} calories/day
@@ -234,6 +292,8 @@ def calculate_nutrition(
 - Eat carbs 2-3 hours before runs
 - Protein within 30 min post-run for recovery
 - Stay hydrated: aim for {weight_kg * 35:.0f}ml water daily"""
+    
+    return ToolResult(data=data, text=text)
 
 
 @tool
@@ -241,7 +301,7 @@ def calculate_pace(
     distance_km: float,
     time_minutes: float,
     target_distance: Optional[float] = None
-) -> str:
+) -> ToolResult:
     """
     Calculate running pace and predict race times.
     
@@ -258,6 +318,20 @@ def calculate_pace(
     # Speed
     speed_kmh = (distance_km / time_minutes) * 60
     
+    predictions = {
+        "5K": format_time(pace_per_km * 5),
+        "10K": format_time(pace_per_km * 10),
+        "Half": format_time(pace_per_km * 21.1),
+        "Marathon": format_time(pace_per_km * 42.2),
+    }
+    data = {
+        "dist_km": round(distance_km, 2),
+        "time": format_time(time_minutes),
+        "pace_km": f"{pace_min}:{pace_sec:02d}",
+        "speed_kmh": round(speed_kmh, 1),
+        "pred": predictions,
+    }
+    
     result = f"""Pace Analysis:
 
 ⏱️ Your Stats:
@@ -267,16 +341,17 @@ def calculate_pace(
 - Speed: {speed_kmh:.1f} km/h
 
 🏆 Race Time Predictions (based on current pace):
-- 5K: {format_time(pace_per_km * 5)}
-- 10K: {format_time(pace_per_km * 10)}
-- Half Marathon: {format_time(pace_per_km * 21.1)}
-- Marathon: {format_time(pace_per_km * 42.2)}"""
+- 5K: {predictions["5K"]}
+- 10K: {predictions["10K"]}
+- Half Marathon: {predictions["Half"]}
+- Marathon: {predictions["Marathon"]}"""
     
     if target_distance:
         predicted = pace_per_km * target_distance
+        data["pred"][f"{target_distance:g}km"] = format_time(predicted)
         result += f"\n\n🎯 Target {target_distance}km: {format_time(predicted)}"
     
-    return result
+    return ToolResult(data=data, text=result)
 
 
 def format_time(minutes: float) -> str:
@@ -0,0 +1,424 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import requests
+
+from config import (
+    WEATHER_MAX_AGE_SECONDS,
+    WEATHER_REFRESH_SECONDS,
+    WEATHER_ACTIVE_WINDOW_SECONDS,
+    WEATHER_PREFETCH_CONCURRENCY,
+    WEATHER_HOURLY_BUDGET,
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def location_key(location: str) -> str:
+    """Case/spacing-insensitive store key ("Kathmandu , Nepal" == "kathmandu, nepal")"""
+    return ", ".join(" ".join(part.split()) for part in location.lower().split(","))
+
+
+def resolve_location(requested: str, profile_location: str = None) -> str:
+    """
+    Map an LLM-supplied location onto the profile location when they name the
+    same place ("Kathmandu, Nepal" vs "Kathmandu"), so both share one stored forecast.
+    Parts missing on either side are filled in from the other before comparing,
+    so "London, UK" is never rewritten to a "London, Ontario" profile.
+    """
+    if not requested or not profile_location or not profile_location.strip():
+        return requested
+    wanted = location_key(requested).split(", ")
+    home = location_key(profile_location).split(", ")
+    size = max(len(wanted), len(home))
+    wanted += home[len(wanted):size]
+    home += wanted[len(home):size]
+    return profile_location if wanted == home else requested
+
+
+def fetch_raw(location: str) -> dict:
+    """Fetch the wttr.in JSON payload, or None if the location is unknown"""
+    response = requests.get(f"https://wttr.in/{location}?format=j1", timeout=10)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+# Per-hour forecast fields parsed into (days, slots) arrays
+HOURLY_FIELDS = {
+    "temp_c": "tempC",
+    "feels_c": "FeelsLikeC",
+    "hum": "humidity",
+    "wind_kmh": "windspeedKmph",
+    "rain_pct": "chanceofrain",
+}
+
+# Conditions that rule a slot out entirely
+UNSAFE_CONDITIONS = ("thunder", "storm", "blizzard", "freezing")
+
+
+def parse_forecast(data: dict) -> dict:
+    """
+    Parse a wttr.in payload once into current conditions plus compact
+    per-hour arrays (shape: days x slots) for every forecast day.
+    """
+    current = data["current_condition"][0]
+    days = data.get("weather", [])[:3]
+    hourly = [day["hourly"] for day in days]
+    slots = min((len(hours) for hours in hourly), default=0)
+
+    forecast = {
+        "current": {
+            "desc": current["weatherDesc"][0]["value"],
+            "temp_c": int(current["temp_C"]),
+            "feels_c": int(current["FeelsLikeC"]),
+            "hum": int(current["humidity"]),
+            "wind_kmh": int(current["windspeedKmph"]),
+            "observed": current.get("localObsDateTime"),
+        },
+        "dates": [day["date"] for day in days],
+        "hours": np.array(
+            [[int(hour["time"]) // 100 for hour in hours[:slots]] for hours in hourly], dtype=np.int16
+        ).reshape(len(hourly), slots),
+        "desc": np.array(
+            [[hour["weatherDesc"][0]["value"] for hour in hours[:slots]] for hours in hourly], dtype=str
+        ).reshape(len(hourly), slots),
+    }
+
+    for field, key in HOURLY_FIELDS.items():
+        forecast[field] = np.array(
+            [[hour.get(key, "0") for hour in hours[:slots]] for hours in hourly], dtype=np.int16
+        ).reshape(len(hourly), slots)
+
+    return forecast
+
+
+def _observed_hour(forecast: dict):
+    """(date, hour) of the current observation, if wttr.in reported it"""
+    observed = forecast["current"].get("observed")
+    if not observed:
+        return None
+    try:
+        obs = datetime.strptime(observed, "%Y-%m-%d %I:%M %p")
+    except ValueError:
+        return None
+    return obs.strftime("%Y-%m-%d"), obs.hour
+
+
+def past_slots(forecast: dict) -> np.ndarray:
+    """Mask of slots already over at the observation time (today only)"""
+    hours = forecast["hours"]
+    past = np.zeros(hours.shape, dtype=bool)
+    observed = _observed_hour(forecast)
+    if observed and forecast["dates"] and forecast["dates"][0] == observed[0]:
+        # Slots cover three hours
+        past[0] = hours[0] + 3 <= observed[1]
+    return past
+
+
+def dark_slots(forecast: dict) -> np.ndarray:
+    hours = forecast["hours"]
+    return (hours < 5) | (hours >= 21)
+
+
+def slots_left(forecast: dict) -> np.ndarray:
+    """Per day: whether any daylight slot is still ahead (False once today is over)"""
+    return np.any(~(past_slots(forecast) | dark_slots(forecast)), axis=1)
+
+
+def score_slots(forecast: dict) -> np.ndarray:
+    """
+    Score every forecast slot for running (1-100, higher is better).
+    Unsafe, dark, already-past or zero-scoring (not runnable) slots score -inf.
+    """
+    feels = forecast["feels_c"].astype(np.float32)
+    scores = (
+        100
+        - 3.0 * np.clip(8 - feels, 0, None)        # too cold
+        - 4.0 * np.clip(feels - 15, 0, None)       # too warm
+        - 0.5 * np.clip(forecast["hum"] - 70, 0, None)
+        - 1.5 * np.clip(forecast["wind_kmh"] - 15, 0, None)
+        - 0.6 * forecast["rain_pct"]
+    )
+    scores = np.clip(scores, 0, 100)
+
+    desc = np.char.lower(forecast["desc"])
+    unsafe = np.zeros(desc.shape, dtype=bool)
+    for condition in UNSAFE_CONDITIONS:
+        unsafe |= np.char.find(desc, condition) >= 0
+    scores[(scores <= 0) | unsafe | dark_slots(forecast) | past_slots(forecast)] = -np.inf
+
+    return scores
+
+
+def rank_run_windows(forecast: dict, top_n: int = 3, scores: np.ndarray = None) -> list[dict]:
+    """Best run windows across all forecast days, highest score first"""
+    if scores is None:
+        scores = score_slots(forecast)
+    flat = scores.ravel()
+    order = np.argsort(-flat, kind="stable")[:top_n]
+
+    windows = []
+    for index in order:
+        if not np.isfinite(flat[index]):
+            break
+        day, slot = np.unravel_index(index, scores.shape)
+        windows.append(window_at(forecast, scores, day, slot))
+    return windows
+
+
+def best_window_per_day(forecast: dict, scores: np.ndarray = None) -> list:
+    """Best run window for each forecast day (None if no runnable slot; see slots_left)"""
+    if scores is None:
+        scores = score_slots(forecast)
+    if scores.size == 0:
+        return [None] * len(forecast["dates"])
+    best = np.argmax(scores, axis=1)
+    return [
+        window_at(forecast, scores, day, slot) if np.isfinite(scores[day, slot]) else None
+        for day, slot in enumerate(best)
+    ]
+
+
+def window_at(forecast: dict, scores: np.ndarray, day: int, slot: int) -> dict:
+    return {
+        "date": forecast["dates"][day],
+        "time": f"{int(forecast['hours'][day, slot]):02d}:00",
+        "score": int(round(float(scores[day, slot]))),
+        "desc": str(forecast["desc"][day, slot]),
+        "temp_c": int(forecast["temp_c"][day, slot]),
+        "feels_c": int(forecast["feels_c"][day, slot]),
+        "hum": int(forecast["hum"][day, slot]),
+        "wind_kmh": int(forecast["wind_kmh"][day, slot]),
+        "rain_pct": int(forecast["rain_pct"][day, slot]),
+    }
+
+
+def midday_slot(forecast: dict, day: int) -> int:
+    """Index of the noon slot (or the middle one if noon is missing)"""
+    noon = np.flatnonzero(forecast["hours"][day] == 12)
+    return int(noon[0]) if noon.size else forecast["hours"].shape[1] // 2
+
+
+class RequestBudget:
+    """Sliding one-hour budget shared by live and background weather requests"""
+
+    def __init__(self, per_hour: int = WEATHER_HOURLY_BUDGET):
+        self.per_hour = per_hour
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._sent and now - self._sent[0] > 3600:
+            self._sent.popleft()
+
+    def try_acquire(self) -> bool:
+        """Take a slot for a background request if the budget allows it"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._sent) >= self.per_hour:
+                return False
+            self._sent.append(now)
+            return True
+
+    def record(self):
+        """Count a live request (never refused)"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._sent.append(now)
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._trim(time.monotonic())
+            return max(0, self.per_hour - len(self._sent))
+
+
+class ForecastStore:
+    """Parsed forecasts by location, refreshed live or by the prefetcher"""
+
+    def __init__(self, max_age_seconds: float = WEATHER_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self.budget = RequestBudget()
+        self._forecasts = {}
+        self._fetching = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+
+    def age(self, location: str) -> float:
+        """Seconds since the location was last fetched (inf if never)"""
+        with self._lock:
+            entry = self._forecasts.get(location_key(location))
+        return time.monotonic() - entry[1] if entry else float("inf")
+
+    def get_fresh(self, location: str) -> dict:
+        with self._lock:
+            entry = self._forecasts.get(location_key(location))
+        if entry and time.monotonic() - entry[1] < self.max_age_seconds:
+            return entry[0]
+        return None
+
+    def put(self, location: str, forecast: dict):
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired forecasts so one-off locations don't pile up
+            expired = [key for key, (_, fetched) in self._forecasts.items() if now - fetched >= self.max_age_seconds]
+            for key in expired:
+                del self._forecasts[key]
+            self._forecasts[location_key(location)] = (forecast, now)
+
+    def refresh(self, location: str, live: bool = False) -> dict:
+        """
+        Fetch, parse and store a forecast. Concurrent refreshes of the same
+        location share one fetch; live fetches are counted against the budget.
+        """
+        key = location_key(location)
+        with self._lock:
+            pending = self._fetching.get(key)
+            if pending is None:
+                self._fetching[key] = pending = Future()
+                owner = True
+            else:
+                self.joined += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            if live:
+                self.budget.record()
+            data = fetch_raw(location)
+            forecast = parse_forecast(data) if data is not None else None
+            if forecast is not None:
+                self.put(location, forecast)
+            pending.set_result(forecast)
+            return forecast
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._fetching.pop(key, None)
+
+    def get_forecast(self, location: str) -> dict:
+        """Return a stored forecast, fetching it live if missing or stale"""
+        forecast = self.get_fresh(location)
+        if forecast is not None:
+            self.hits += 1
+            return forecast
+
+        self.misses += 1
+        return self.refresh(location, live=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            locations = len(self._forecasts)
+        return {
+            "locations": locations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined_fetches": self.joined,
+            "budget_remaining": self.budget.remaining(),
+        }
+
+
+class WeatherPrefetcher:
+    """Background refresh of forecasts for recently active users' locations"""
+
+    def __init__(self, store: ForecastStore):
+        self.store = store
+        self._active = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+        self._pending = set()
+
+    def touch(self, location: str):
+        """Record activity for a profile location, prefetching it if newly seen"""
+        if not location or not location.strip():
+            return
+        key = location_key(location)
+        now = time.monotonic()
+        with self._lock:
+            last_seen = self._active.get(key)
+            self._active[key] = now
+        if last_seen is None or now - last_seen > WEATHER_ACTIVE_WINDOW_SECONDS:
+            self._schedule(location)
+
+    def _schedule(self, location: str):
+        """Queue an immediate refresh on the scheduler's loop (no-op before it starts)"""
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        def start():
+            task = asyncio.ensure_future(self._refresh_one(location, self._semaphore, jitter=False))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+        self._loop.call_soon_threadsafe(start)
+
+    def active_locations(self) -> list[str]:
+        """Locations seen within the active window (older ones are dropped)"""
+        cutoff = time.monotonic() - WEATHER_ACTIVE_WINDOW_SECONDS
+        with self._lock:
+            self._active = {loc: seen for loc, seen in self._active.items() if seen >= cutoff}
+            return list(self._active)
+
+    async def _refresh_one(self, location: str, semaphore: asyncio.Semaphore, jitter: bool = True):
+        if jitter:
+            # Spread requests over the first part of the cycle instead of bursting
+            await asyncio.sleep(random.uniform(0, WEATHER_REFRESH_SECONDS * 0.1))
+        async with semaphore:
+            # Recently fetched live - no need to spend budget on it yet
+            if self.store.age(location) < WEATHER_REFRESH_SECONDS / 2:
+                return
+            if not self.store.budget.try_acquire():
+                logger.info(f"⏸️ [Weather] Budget exhausted, skipping {location}")
+                return
+            try:
+                await asyncio.to_thread(self.store.refresh, location)
+            except Exception as e:
+                logger.error(f"❌ [Weather] Prefetch failed for {location}: {e}")
+
+    async def refresh_all(self):
+        """Refresh every active location with bounded concurrency"""
+        locations = self.active_locations()
+        if not locations:
+            return
+        await asyncio.gather(*(self._refresh_one(loc, self._semaphore) for loc in locations))
+        logger.info(f"🌤️ [Weather] Refresh cycle done for {len(locations)} active location(s)")
+
+    async def run(self):
+        """Refresh loop with jittered intervals (run as an asyncio task)"""
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(WEATHER_PREFETCH_CONCURRENCY)
+        logger.info("🌤️ [Weather] Prefetch scheduler started")
+        try:
+            while True:
+                # First cycle runs right away for locations touched before startup
+                try:
+                    await self.refresh_all()
+                except Exception as e:
+                    logger.error(f"❌ [Weather] Prefetch cycle failed: {e}")
+                await asyncio.sleep(WEATHER_REFRESH_SECONDS * random.uniform(0.8, 1.2))
+        finally:
+            self._loop = None
+            for task in list(self._pending):
+                task.cancel()
+
+
+# Global instances
+forecast_store = ForecastStore()
+weather_prefetcher = WeatherPrefetcher(forecast_store)
@@ -16,8 +16,19 @@ function ChatApp() {
     setMessages((prev) => [...prev, { role: "user", content: message }]);
     setIsLoading(true);
 
+    // One key per submission: a retry replays the first result instead of
+    // running the chat again
+    const idempotencyKey = crypto.randomUUID();
+
     try {
-      const response = await chatAPI.sendMessage(message, userProfile);
+      let response;
+      try {
+        response = await chatAPI.sendMessage(message, userProfile, idempotencyKey);
+      } catch (error) {
+        // Only retry when the request never got an answer (network drop)
+        if (error.response) throw error;
+        response = await chatAPI.sendMessage(message, userProfile, idempotencyKey);
+      }
 
       setMessages((prev) => [
         ...prev,
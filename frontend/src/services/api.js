@@ -10,11 +10,19 @@ const api = axios.create({
 });
 
 export const chatAPI = {
-  sendMessage: async (message, userProfile = null) => {
-    const response = await api.post("/chat", {
-      message,
-      user_profile: userProfile,
-    });
+  // Pass the same idempotencyKey when retrying a message so the backend
+  // replays the first result instead of running the chat again.
+  sendMessage: async (message, userProfile = null, idempotencyKey = null) => {
+    const response = await api.post(
+      "/chat",
+      {
+        message,
+        user_profile: userProfile,
+      },
+      idempotencyKey
+        ? { headers: { "Idempotency-Key": idempotencyKey } }
+        : undefined,
+    );
     return response.data;
   },
 